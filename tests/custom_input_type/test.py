@@ -0,0 +1,44 @@
+from versuchung.experiment import Experiment
+from versuchung.types import String
+
+class Level(String):
+    """Input type that uses more of the OptionParser API than add_option()"""
+    def inp_setup_cmdline_parser(self, parser):
+        String.inp_setup_cmdline_parser(self, parser)
+        parser.set_defaults(**{self.name + "_level": "high"})
+        parser.add_option("", "--" + self.name + "-level", dest=self.name + "_level")
+
+    def inp_extract_cmdline_parser(self, opts, args):
+        String.inp_extract_cmdline_parser(self, opts, args)
+        self.level = getattr(opts, self.name + "_level")
+
+class CustomInputExperiment(Experiment):
+    inputs = {"s": Level("x")}
+
+    def run(self):
+        assert self.s.value == "x"
+
+if __name__ == "__main__":
+    import shutil
+    import sys
+
+    # Every instance builds its own parser
+    for level in ("high", "low"):
+        e = CustomInputExperiment()
+        args = ["--s-level", level] if level != "high" else []
+        dirname = e(args)
+        assert e.inputs.s.level == level
+        shutil.rmtree(dirname)
+
+    # Without arguments, execute(None) parses sys.argv
+    argv = sys.argv
+    sys.argv = [argv[0], "--s-level", "low"]
+    try:
+        e = CustomInputExperiment()
+        dirname = e.execute(None)
+    finally:
+        sys.argv = argv
+    assert e.inputs.s.level == "low"
+    shutil.rmtree(dirname)
+
+    print("success")
@@ -0,0 +1,55 @@
+from versuchung.experiment import Experiment
+from versuchung.types import String
+import hashlib
+import os
+
+class HashExperiment(Experiment):
+    inputs = {"s": String("x")}
+
+    def run(self):
+        pass
+
+class TupleVersionExperiment(HashExperiment):
+    version = (1, 2)
+
+class Blake2bExperiment(HashExperiment):
+    hash_algorithm = "blake2b"
+
+class Sha256Experiment(HashExperiment):
+    hash_algorithm = "sha256"
+
+if __name__ == "__main__":
+    import shutil
+
+    # The identifier must stay stable across versuchung versions
+    e = HashExperiment()
+    dirname = e([])
+    assert os.path.basename(dirname) == "HashExperiment-" + \
+        hashlib.md5(b"version 1s x").hexdigest()
+    shutil.rmtree(dirname)
+
+    e = TupleVersionExperiment()
+    dirname = e([])
+    assert os.path.basename(dirname) == "TupleVersionExperiment-" + \
+        hashlib.md5(b"version (1, 2)s x").hexdigest()
+    shutil.rmtree(dirname)
+
+    e = Blake2bExperiment()
+    dirname = e([])
+    experiment_hash = os.path.basename(dirname).split("-")[1]
+    assert len(experiment_hash) == 32
+    int(experiment_hash, 16)
+    assert experiment_hash == \
+        hashlib.blake2b(b"version 1s x", digest_size=16).hexdigest()
+    assert experiment_hash != hashlib.md5(b"version 1s x").hexdigest()
+    assert e.metadata["experiment-hash"] == experiment_hash
+    shutil.rmtree(dirname)
+
+    # Only md5 and blake2b result in valid identifiers
+    try:
+        Sha256Experiment()([])
+        assert False, "sha256 was accepted"
+    except ValueError:
+        pass
+
+    print("success")
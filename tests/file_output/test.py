@@ -30,4 +30,55 @@ if __name__ == "__main__":
 
     if dirname:
         shutil.rmtree(dirname)
+
+    # Reading a file in text mode translates the newlines
+    path = os.path.abspath("crlf_file")
+    with open(path, "wb") as fd:
+        fd.write(b"a\r\nb\rc\n")
+    assert File(path).value == "a\nb\nc\n"
+    assert File(path, binary=True).value == b"a\r\nb\rc\n"
+    os.unlink(path)
+
+    # Appended content is added to the end of an existing file
+    path = os.path.abspath("append_file")
+    with open(path, "w") as fd:
+        fd.write("old content\n")
+    f = File(path)
+    f.write("a\n", append=True)
+    f.write("b\n", append=True)
+    f.flush()
+    assert open(path).read() == "old content\na\nb\n"
+
+    # Content that was only read is not written again
+    f = File(path)
+    assert f.value == "old content\na\nb\n"
+    os.unlink(path)
+    f.flush()
+    assert not os.path.exists(path)
+
+    # An assigned value replaces the file, even if it is empty
+    with open(path, "w") as fd:
+        fd.write("old content\n")
+    f = File(path)
+    f.value = ""
+    f.flush()
+    assert open(path).read() == ""
+
+    f = File(path)
+    f.value = ""
+    f.write("new\n", append=True)
+    f.flush()
+    assert open(path).read() == "new\n"
+
+    # A read value with appended content is written as a whole
+    f = File(path)
+    f.write("more\n", append=True)
+    assert f.value == "new\nmore\n"
+    f.flush()
+    assert open(path).read() == "new\nmore\n"
+    f.write("end\n", append=True)
+    f.flush()
+    assert open(path).read() == "new\nmore\nend\n"
+    os.unlink(path)
+
     print("success")
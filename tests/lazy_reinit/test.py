@@ -0,0 +1,50 @@
+from versuchung.experiment import Experiment
+from versuchung.types import String
+from versuchung.files import File
+import os
+
+class Upstream(Experiment):
+    inputs = {"s": String("default")}
+    outputs = {"out": File("out")}
+
+    def run(self):
+        self.out.value = self.s.value
+
+class Downstream(Experiment):
+    inputs = {"up": Upstream()}
+
+    def run(self):
+        # Type.before_experiment_run walks the subobjects directly
+        assert self.up.subobjects["s"].value == "X"
+        assert self.up.s.value == "X"
+        assert self.up.out.value == "X"
+
+if __name__ == "__main__":
+    import shutil
+    up = Upstream()
+    dirname = up(["--s", "X"])
+
+    # The inputs are reinitialized, however they are accessed first
+    assert dict(Upstream(dirname).inputs)["s"].value == "X"
+    assert {**Upstream(dirname).inputs}["s"].value == "X"
+    assert [x.value for x in Upstream(dirname).inputs.values()] == ["X"]
+    assert Upstream(dirname).s.value == "X"
+
+    down = Downstream()
+    dirname2 = down(["--up", dirname])
+    assert Downstream(dirname2).up.s.value == "X"
+
+    # Without valid metadata, every access fails
+    with open(os.path.join(dirname, "metadata"), "w") as fd:
+        fd.write("invalid")
+    broken = Upstream(dirname)
+    for _ in range(2):
+        try:
+            broken.inputs.s.value
+            assert False, "invalid metadata was not reported"
+        except RuntimeError:
+            pass
+
+    shutil.rmtree(dirname)
+    shutil.rmtree(dirname2)
+    print("success")
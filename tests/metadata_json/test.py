@@ -0,0 +1,49 @@
+from versuchung.experiment import Experiment
+from versuchung.types import String
+import json
+import math
+import os
+
+class FloatExperiment(Experiment):
+    inputs = {"f": String(float("nan")),
+              "g": String(float("inf")),
+              "none": String(None)}
+
+    def run(self):
+        pass
+
+if __name__ == "__main__":
+    import shutil
+    e = FloatExperiment()
+    dirname = e([])
+
+    # Non-finite floats survive writing and reading the metadata
+    metadata = FloatExperiment(dirname).metadata
+    assert math.isnan(metadata["f"])
+    assert metadata["g"] == float("inf")
+    assert metadata["none"] is None
+
+    # Metadata written by the json module is read as well
+    with open(os.path.join(dirname, "metadata"), "w") as fd:
+        json.dump({"f": float("nan"), "g": float("-inf")}, fd)
+    metadata = FloatExperiment(dirname).metadata
+    assert math.isnan(metadata["f"])
+    assert metadata["g"] == float("-inf")
+
+    shutil.rmtree(dirname)
+
+    # Short writes are continued, and the umask decides the permissions
+    write = os.write
+    os.write = lambda fd, data: write(fd, bytes(data[:7]))
+    old_umask = os.umask(0o002)
+    try:
+        dirname = FloatExperiment()([])
+    finally:
+        os.write = write
+        os.umask(old_umask)
+    metadata = FloatExperiment(dirname).metadata
+    assert metadata["experiment-name"] == "FloatExperiment"
+    assert os.stat(os.path.join(dirname, "metadata")).st_mode & 0o777 == 0o664
+    shutil.rmtree(dirname)
+
+    print("success")
@@ -0,0 +1,53 @@
+from versuchung.experiment import Experiment
+from versuchung.types import String
+import gc
+import weakref
+
+class CountingString(String):
+    """A parameter type with its own __deepcopy__()"""
+    copies = 0
+    def __deepcopy__(self, memo):
+        CountingString.copies += 1
+        return CountingString(self.value)
+
+class TemplateExperiment(Experiment):
+    inputs = {"s": String("x"),
+              "calc": lambda self: self.s.value + "!"}
+
+    def run(self):
+        pass
+
+if __name__ == "__main__":
+    a = TemplateExperiment()
+    b = TemplateExperiment()
+    assert a.inputs.s is not b.inputs.s
+    assert a.inputs.s.value == b.inputs.s.value == "x"
+    assert list(a.inputs) == ["s", "calc"]
+
+    # Changes to the class-level dictionary are visible in new instances
+    TemplateExperiment.inputs["s"] = String("changed")
+    assert TemplateExperiment().inputs.s.value == "changed"
+
+    TemplateExperiment.inputs["t"] = String("t")
+    assert TemplateExperiment().inputs.t.value == "t"
+
+    del TemplateExperiment.inputs["t"]
+    assert "t" not in TemplateExperiment().inputs
+
+    # A custom __deepcopy__() is used for copying
+    class DeepcopyExperiment(Experiment):
+        inputs = {"s": CountingString("x")}
+    for _ in range(2):
+        assert DeepcopyExperiment().inputs.s.value == "x"
+    assert CountingString.copies == 2
+
+    # The templates do not keep a class alive
+    class Temporary(Experiment):
+        inputs = {"s": String("x")}
+    Temporary()
+    ref = weakref.ref(Temporary)
+    del Temporary
+    gc.collect()
+    assert ref() is None
+
+    print("success")
@@ -0,0 +1,40 @@
+from versuchung.experiment import Experiment
+from versuchung.files import File
+import os
+
+class CleanupExperiment(Experiment):
+    outputs = {"out": File("out")}
+
+    def run(self):
+        self.out.value = "result\n"
+
+if __name__ == "__main__":
+    import shutil
+    import tempfile
+
+    dirname = CleanupExperiment()([])
+
+    # Leftovers of an earlier run of the same result set
+    outside = tempfile.mkdtemp()
+    with open(os.path.join(outside, "data"), "w") as fd:
+        fd.write("keep\n")
+    os.mkdir(os.path.join(dirname, "subdir"))
+    with open(os.path.join(dirname, "subdir", "file"), "w") as fd:
+        fd.write("old\n")
+    with open(os.path.join(dirname, "stale"), "w") as fd:
+        fd.write("old\n")
+    with open(os.path.join(dirname, ".hidden"), "w") as fd:
+        fd.write("keep\n")
+    os.symlink(outside, os.path.join(dirname, "link"))
+
+    assert CleanupExperiment()([]) == dirname
+
+    assert sorted(os.listdir(dirname)) == [".hidden", "metadata", "out"]
+    # Only the symlink is removed, not the directory it points to
+    assert os.listdir(outside) == ["data"]
+    with open(os.path.join(dirname, "out")) as fd:
+        assert fd.read() == "result\n"
+
+    shutil.rmtree(outside)
+    shutil.rmtree(dirname)
+    print("success")
@@ -55,6 +55,15 @@ class TexTest(Experiment):
         assert self.pd.get('1/th=0/b')    == 2
         self.pd.clear()
 
+        # A string is a single level name, not a set of substrings
+        self.pd.pandas(df.set_index(['a', 'th']), names='th')
+        assert self.pd.get('2/th=4/name') == 'b'
+        self.pd.clear()
+
+        self.pd.pandas(df.set_index(['a', 'th']), names='t')
+        assert self.pd.get('2/4/name') == 'b'
+        self.pd.clear()
+
         df.columns.name='col'
 
         self.pd.pandas(df.set_index(['a', 'th']), names=True)
@@ -73,6 +82,17 @@ class TexTest(Experiment):
         assert self.pd.get('stat/50 percent') == 4.5
         self.pd.clear()
 
+        # Dates are written as Timestamps, like the Series values
+        dates = pd.DataFrame({'start': pd.to_datetime(['2020-01-01']),
+                              'end': pd.to_datetime(['2020-01-02'])})
+        self.pd.pandas(dates)
+        assert str(self.pd.get('0/start')) == '2020-01-01 00:00:00'
+        self.pd.clear()
+
+        self.pd.pandas(dates.start)
+        assert str(self.pd.get('0')) == '2020-01-01 00:00:00'
+        self.pd.clear()
+
 if __name__ == "__main__":
     import sys
     import shutil
@@ -93,5 +113,81 @@ if __name__ == "__main__":
     assert len(dref) == 1
     assert dref["foobar"] == "42"
 
+    # Keys that are set in the program take precedence over the file
+    with open(dirname + "/merge.tex", "w") as fd:
+        fd.write("\\pgfkeyssetvalue{/versuchung/a}{1}\n"
+                 "\\pgfkeyssetvalue{/versuchung/b}{1}\n")
+    for read_existing in (False, True):
+        pgf = PgfKeyDict(dirname + "/merge.tex", read_existing=read_existing)
+        pgf["a"] = 2
+        assert pgf["a"] == 2
+        assert pgf["b"] == "1"
+        assert len(pgf) == 2
+        a = pgf.value
+        assert pgf["a"] == 2
+
+    pgf.flush()
+    pgf = PgfKeyDict(dirname + "/merge.tex", read_existing=True)
+    assert dict(pgf) == {"a": "2", "b": "1"}
+
+    # Flushing a new key keeps the keys of an existing file
+    pgf = PgfKeyDict(dirname + "/merge.tex")
+    pgf["new"] = 3
+    pgf.flush()
+    pgf = PgfKeyDict(dirname + "/merge.tex")
+    assert dict(pgf) == {"a": "2", "b": "1", "new": "3"}
+
+    # Deleted keys do not come back from the file
+    del pgf["a"]
+    pgf.flush()
+    pgf = PgfKeyDict(dirname + "/merge.tex")
+    assert sorted(pgf) == ["b", "new"]
+
+    # Every modification between two flushes is written
+    def keys_in_file(path):
+        with open(path) as fd:
+            return [line[len("\\pgfkeyssetvalue{/versuchung/"):line.index("}")]
+                    for line in fd if line.strip()]
+
+    pgf = PgfKeyDict(dirname + "/cache.tex")
+    pgf["b"] = 1
+    pgf.flush()
+    assert keys_in_file(dirname + "/cache.tex") == ["b"]
+    pgf.update({"a": 2})
+    pgf.flush()
+    assert keys_in_file(dirname + "/cache.tex") == ["a", "b"]
+    pgf |= {"c": 3}
+    pgf.flush()
+    assert keys_in_file(dirname + "/cache.tex") == ["a", "b", "c"]
+    pgf.pop("a")
+    pgf.flush()
+    assert keys_in_file(dirname + "/cache.tex") == ["b", "c"]
+    pgf.setdefault("0", 4)
+    del pgf["c"]
+    pgf.flush()
+    assert keys_in_file(dirname + "/cache.tex") == ["0", "b"]
+
+    # Other line break characters are part of the value
+    pgf = PgfKeyDict(dirname + "/breaks.tex")
+    pgf["k"] = "x\x0cy\u2028z"
+    pgf.flush()
+    pgf = PgfKeyDict(dirname + "/breaks.tex")
+    a = pgf.value
+    assert pgf["k"] == "x\x0cy\u2028z"
+    pgf = PgfKeyDict(dirname + "/breaks.tex", read_existing=True)
+    assert pgf["k"] == "x\x0cy\u2028z"
+
+    # A changed format_string is used for writing and parsing
+    pgf = PgfKeyDict(dirname + "/format.tex")
+    pgf.format_string = "\\def{%s/%s}{%s}"
+    pgf["foo"] = 1
+    pgf.flush()
+    with open(dirname + "/format.tex") as fd:
+        assert fd.read() == "\\def{/versuchung/foo}{1}\n"
+    pgf = PgfKeyDict(dirname + "/format.tex")
+    pgf.format_string = "\\def{%s/%s}{%s}"
+    a = pgf.value
+    assert pgf["foo"] == "1"
+
     shutil.rmtree(dirname)
     print("success")
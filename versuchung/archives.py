@@ -12,8 +12,6 @@
 # You should have received a copy of the GNU General Public License along with
 # versuchung.  If not, see <http://www.gnu.org/licenses/>.
 
-from __future__ import print_function
-
 from versuchung.types import Type, InputParameter
 from versuchung.files import Directory, Directory_op_with, File
 from versuchung.execute import shell
@@ -23,10 +21,7 @@ import sys
 import gzip
 import re
 from subprocess import PIPE
-try:
-    from StringIO import StringIO as BytesIO
-except Exception:
-    from io import BytesIO
+from io import BytesIO
 
 class TarArchive(Type, InputParameter, Directory_op_with):
     """Can be used as: **input parameter**
@@ -45,7 +40,7 @@ class TarArchive(Type, InputParameter, Directory_op_with):
         with self.inputs.tar_archive as path:
             # Here we have path == os.path.abspath(os.curdir)
             # Do something in the extracted copy
-            print path
+            print(path)
     """
     def __init__(self, filename = None):
         """The default_filename is either a string to a file. Or a
@@ -147,7 +142,7 @@ class GitArchive(InputParameter, Type, Directory_op_with):
         with self.inputs.git_archive as path:
             # Here we have path == os.path.abspath(os.curdir)
             # Do something in the extracted copy
-            print path
+            print(path)
     """
 
     def __init__(self, clone_url = None, ref = "refs/heads/master", shallow=False,
@@ -12,8 +12,6 @@
 # You should have received a copy of the GNU General Public License along with
 # versuchung.  If not, see <http://www.gnu.org/licenses/>.
 
-from __future__ import print_function
-
 from versuchung.types import Type, InputParameter, OutputParameter
 import logging
 import sqlite3
@@ -35,7 +33,7 @@ class Database_Abstract:
 
            (cols, rows) = database.values("metadata", "")
            for row in rows:
-                print cols, rows
+                print(cols, rows)
         """
         cur = self.handle.cursor()
         cur.execute('select * from ' + table_name + filter_expr,
@@ -12,26 +12,67 @@
 # You should have received a copy of the GNU General Public License along with
 # versuchung.  If not, see <http://www.gnu.org/licenses/>.
 
-from __future__ import print_function
-
 from optparse import OptionParser
 import datetime
 import logging
 from versuchung.types import InputParameter, OutputParameter, Type
 from versuchung.files import Directory
-from versuchung.tools import JavascriptStyleDictAccess, setup_logging
+from versuchung.tools import JavascriptStyleDictAccess, LazyJavascriptStyleDictAccess, setup_logging
 import sys
 import os.path
-import glob
 import hashlib
 import json
 import shutil
 import copy
+import pickle
 import tempfile
 import signal
+import re
+
+# orjson is an optional dependency, which speeds up reading and
+# writing the metadata
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 LambdaType = type(lambda x:x)
 
+EXPERIMENT_ID_RE = re.compile(r"^[^/]+-[0-9a-f]{32}$")
+
+def metadata_loads(data):
+    """Parse serialized metadata (str or bytes). Raises
+    json.JSONDecodeError on invalid input."""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # e.g., NaN or Infinity, which the json module accepts
+            pass
+    return json.loads(data)
+
+def metadata_dumps(metadata):
+    """Serialize metadata to compact JSON bytes"""
+    if orjson is not None:
+        try:
+            data = orjson.dumps(metadata, option=orjson.OPT_NON_STR_KEYS)
+            # orjson writes NaN and Infinity as null. As null is rare
+            # in metadata, these cases are left to the json module.
+            if b"null" not in data:
+                return data
+        except TypeError:
+            # e.g., integers beyond 64 bit; the json module handles them
+            pass
+    return json.dumps(metadata, separators=(",", ":")).encode()
+
+def build_hash_input(metadata, version):
+    """Return the byte string from which the experiment hash is
+    calculated. The parts are concatenated without separator, which
+    results in the same hash as feeding them one by one."""
+    parts = ["version %s" % (version,)]
+    parts.extend(["%s %s" % (key, metadata[key]) for key in sorted(metadata)])
+    return "".join(parts).encode()
+
 class ExperimentError(Exception):
     pass
 
@@ -42,6 +83,13 @@ class Experiment(Type, InputParameter):
     """Version of the experiment, defaults to 1. The version is
     included in the metadata **and** used for the metadata hash."""
 
+    hash_algorithm = "md5"
+    """Hash function that is used to calculate the metadata hash,
+    defaults to ``"md5"``. Set it to ``"blake2b"`` for a faster hash
+    with the same length (32 hex digits). Other values raise a
+    ``ValueError``. Changing it changes the names of all result sets
+    of the experiment."""
+
 
     i = None
     """Shorthand for :attr:`~.inputs`"""
@@ -145,31 +193,29 @@ class Experiment(Type, InputParameter):
             self.base_directory = os.path.join(os.curdir, experiment_path)
             self.base_directory = os.path.realpath(self.base_directory)
             assert os.path.exists(self.base_directory)
-
-            try:
-                with open(os.path.join(experiment_path, "metadata"), "r") as fd:
-                    metadata = json.load(fd)
-            except json.JSONDecodeError:
-                if os.getenv("VERSUCHUNG_METADATA_EVAL"):
-                    with open(os.path.join(experiment_path, "metadata"), "r") as fd:
-                        metadata = eval(fd.read())
-                else:
-                    raise RuntimeError("metadata is invalid JSON. Set VERSUCHUNG_METADATA_EVAL=1 to load metadata exported via pprint") from None
-            self.__metadata = metadata
         else:
             self.base_directory = None
-            self.__metadata = None
+        # The metadata is loaded on demand by the metadata property
+        self.__metadata = None
 
         # Copy input and output objects
-        self.inputs = JavascriptStyleDictAccess(copy.deepcopy(self.__class__.inputs))
+        inputs = self.__clone_parameters("inputs")
+        if experiment_path:
+            # The inputs are reinitialized from the metadata, when
+            # they are accessed for the first time. Relative paths in
+            # the metadata are resolved against the current directory.
+            self.__reinit_directory = os.path.abspath(os.curdir)
+            self.inputs = LazyJavascriptStyleDictAccess(inputs, self.__reinit_inputs)
+        else:
+            self.inputs = JavascriptStyleDictAccess(inputs)
         self.i = self.inputs
-        self.outputs = JavascriptStyleDictAccess(copy.deepcopy(self.__class__.outputs))
+        self.outputs = JavascriptStyleDictAccess(self.__clone_parameters("outputs"))
         self.o = self.outputs
 
         self.subobjects.clear()
 
         # Sanity checking for input parameters.
-        for (name, inp) in self.inputs.items():
+        for (name, inp) in inputs.items():
             # Lambdas are resolved, when the experiment is really started
             if type(inp) == LambdaType:
                 continue
@@ -186,8 +232,12 @@ class Experiment(Type, InputParameter):
             self.subobjects[name] = outp
 
 
+    def __reinit_inputs(self):
         # Reinit Children Attributes
-        if experiment_path:
+        metadata = self.metadata
+        cwd = os.path.abspath(os.curdir)
+        os.chdir(self.__reinit_directory)
+        try:
             for (name, inp) in self.inputs.items():
                 if hasattr(inp, "__reinit__"):
                     try:
@@ -199,10 +249,73 @@ class Experiment(Type, InputParameter):
                     # We cannot reinit this input from metadata. Therefore it is better to clear it.
                     logging.debug('Cannot reinit field %s. Setting it to None', name)
                     self.inputs[name] = None
-
-
+        finally:
+            os.chdir(cwd)
+
+    def __clone_parameters(self, attr):
+        """Return a fresh copy of the class-level inputs or outputs
+        dictionary. The dictionary is pickled once per class and
+        unpickled for every copy, which is considerably cheaper than a
+        deepcopy. Parameters that cannot be pickled, or that define
+        their own __deepcopy__(), are deep copied.
+
+        Lambdas (calculated input parameters) are not copied at all,
+        but shared by reference. They are never modified, and would
+        otherwise prevent pickling the dictionary.
+
+        Adding, removing or replacing entries of the class-level
+        dictionary invalidates the pickled template. Changing the
+        state of a parameter object in place after the first instance
+        was created is not detected; replace the object instead."""
+        cls = self.__class__
+        params = getattr(cls, attr)
+        lambdas = {k: v for (k, v) in params.items() if type(v) == LambdaType}
+        if lambdas:
+            others = {k: v for (k, v) in params.items() if k not in lambdas}
+        else:
+            others = params
+
+        # The templates are stored in the class itself, so they are
+        # freed together with the class (e.g., redefined in a notebook)
+        templates = cls.__dict__.get("_Experiment__templates")
+        if templates is None:
+            templates = {}
+            cls._Experiment__templates = templates
+        template = templates.get(attr)
+        # The template keeps the pickled items alive, so their ids
+        # cannot be reused by replacements
+        items = tuple(params.items())
+        if template is None or len(template[0]) != len(items) \
+           or not all(k1 == k2 and v1 is v2
+                      for ((k1, v1), (k2, v2)) in zip(template[0], items)):
+            blob = None
+            if not any(hasattr(type(v), "__deepcopy__") for v in others.values()):
+                try:
+                    blob = pickle.dumps(others, pickle.HIGHEST_PROTOCOL)
+                except Exception:
+                    pass
+            template = (items, blob)
+            templates[attr] = template
+
+        copied = None
+        if template[1] is not None:
+            try:
+                copied = pickle.loads(template[1])
+            except Exception:
+                templates[attr] = (items, None)
+        if copied is None:
+            copied = copy.deepcopy(others)
+        if not lambdas:
+            return copied
+        # Keep the order of the class-level dictionary
+        return {k: lambdas[k] if k in lambdas else copied[k] for k in params}
 
     def __setup_parser(self):
+        # The parser is built for every instance, as the option
+        # defaults depend on the state of the input parameters. Input
+        # types may use the whole OptionParser API (set_defaults(),
+        # option groups, ...), so a cached parser cannot be refreshed
+        # reliably.
         self.__parser = OptionParser("%prog <options>")
         self.__parser.add_option('-d', '--base-dir', dest='base_dir', action='store',
                                  help="Directory which is used for storing the experiment data",
@@ -256,7 +369,12 @@ class Experiment(Type, InputParameter):
 
         # Set up the argument parsing
         self.__setup_parser()
-        (opts, args) = self.__parser.parse_args(args)
+        if args is None or args:
+            # None parses sys.argv[1:]
+            (opts, args) = self.__parser.parse_args(args)
+        else:
+            # Nothing to parse, e.g., execute() with keyword arguments
+            (opts, args) = (self.__parser.get_default_values(), [])
         setup_logging(opts.verbose)
 
         self.__opts = opts
@@ -312,11 +430,17 @@ class Experiment(Type, InputParameter):
     def before_experiment_run(self, parameter_type):
         # When experiment run as input, just run the normal input handlers
         if parameter_type == "input":
+            # The subobjects are the input objects themselves, which
+            # have to be reinitialized before they are used
+            if isinstance(self.inputs, LazyJavascriptStyleDictAccess):
+                self.inputs._resolve()
             Type.before_experiment_run(self, "input")
             return
 
+        lambdas = []
         for (name, inp) in self.inputs.items():
             if type(inp) == LambdaType:
+                lambdas.append((name, inp))
                 continue
             ret = inp.inp_extract_cmdline_parser(self.__opts, self.__args)
             if ret:
@@ -324,9 +448,7 @@ class Experiment(Type, InputParameter):
 
         # After all input parameters are parsed. Execute the
         # calculated input parameters
-        for (name, inp) in self.inputs.items():
-            if type(inp) != LambdaType:
-                continue
+        for (name, inp) in lambdas:
             inp = inp(self)
             inp.name = name
             self.subobjects[name] = inp
@@ -349,15 +471,22 @@ class Experiment(Type, InputParameter):
 
     def __calculate_metadata(self):
         metadata = {}
-        for name in self.inputs:
-            metadata.update( self.inputs[name].inp_metadata() )
-        m = hashlib.md5()
-        m.update(("version %s" % str(self.version)).encode())
+        update = metadata.update
+        for inp in self.inputs.values():
+            update(inp.inp_metadata())
         calc_metadata = self.filter_metadata(metadata)
-        for key in sorted(calc_metadata.keys()):
-            m.update((key + " " + str(calc_metadata[key])).encode())
+        data = build_hash_input(calc_metadata, self.version)
+        if self.hash_algorithm == "blake2b":
+            m = hashlib.blake2b(data, digest_size=16)
+        elif self.hash_algorithm == "md5":
+            m = hashlib.md5(data)
+        else:
+            # Other digests do not result in 32 hex digits
+            raise ValueError("hash_algorithm must be \"md5\" or \"blake2b\", not %r"
+                             % (self.hash_algorithm,))
 
-        self.__experiment_instance = "%s-%s" %(self.title, m.hexdigest())
+        experiment_hash = m.hexdigest()
+        self.__experiment_instance = "%s-%s" %(self.title, experiment_hash)
         if self.__opts.dummy_result:
             base = self.tmp_directory.path
         else:
@@ -368,11 +497,15 @@ class Experiment(Type, InputParameter):
 
         if os.path.exists(self.base_directory):
             logging.info("Removing all files from existing output directory")
-            for f in glob.glob(os.path.join(self.base_directory, '*')):
-                if os.path.isdir(f):
-                    shutil.rmtree(f)
-                else:
-                    os.unlink(f)
+            with os.scandir(self.base_directory) as it:
+                for entry in it:
+                    # Hidden files are kept
+                    if entry.name.startswith("."):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        shutil.rmtree(entry.path)
+                    else:
+                        os.unlink(entry.path)
 
         try:
             os.mkdir(self.base_directory)
@@ -384,12 +517,27 @@ class Experiment(Type, InputParameter):
         metadata["date-start"] = str(datetime.datetime.now())
         metadata["experiment-name"] = self.title
         metadata["experiment-version"] = self.version
-        metadata["experiment-hash"]    = m.hexdigest()
-
-        with open(os.path.join(self.base_directory, "metadata"), "w") as fd:
-            json.dump(metadata, fd)
+        metadata["experiment-hash"]    = experiment_hash
 
         self.__metadata = metadata
+        self.__write_metadata()
+
+    def __write_metadata(self):
+        # Serialize first and hand the whole payload to write(). The
+        # file is replaced atomically, so an interrupted run never
+        # leaves a truncated metadata file behind.
+        payload = metadata_dumps(self.__metadata)
+        path = os.path.join(self.base_directory, "metadata")
+        # The permissions are left to the umask, as with open()
+        fd = os.open(path + ".tmp", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+        try:
+            # write() may write less than the whole payload
+            view = memoryview(payload)
+            while view:
+                view = view[os.write(fd, view):]
+        finally:
+            os.close(fd)
+        os.replace(path + ".tmp", path)
 
 
     def symlink_name(self):
@@ -409,8 +557,7 @@ class Experiment(Type, InputParameter):
                 inp.after_experiment_run("input")
 
             self.__metadata["date-end"] = str(datetime.datetime.now())
-            with open(os.path.join(self.base_directory, "metadata"), "w") as fd:
-                json.dump(self.__metadata, fd)
+            self.__write_metadata()
 
             shutil.rmtree(self.tmp_directory.path)
 
@@ -443,9 +590,14 @@ class Experiment(Type, InputParameter):
             print("Missing argument for %s" % self.title)
             raise ExperimentError
 
-        # Resolve symlink relative to the current directory
-        path = os.path.realpath(self.__experiment_instance)
-        path = os.path.abspath(path)
+        if EXPERIMENT_ID_RE.match(self.__experiment_instance):
+            # A result set name (<title>-<hash>) is no symlink, that
+            # has to be resolved. __reinit__ calls realpath anyway.
+            path = os.path.abspath(self.__experiment_instance)
+        else:
+            # Resolve symlink relative to the current directory
+            path = os.path.realpath(self.__experiment_instance)
+            path = os.path.abspath(path)
         self.__experiment_instance = os.path.basename(path)
 
         self.base_directory = path
@@ -469,8 +621,15 @@ class Experiment(Type, InputParameter):
         finished experiments by reading the /metadata file."""
         if not self.__metadata:
             md_path = os.path.join(self.base_directory, "metadata")
-            with open(md_path) as fd:
-                self.__metadata = json.load(fd)
+            try:
+                with open(md_path, "rb") as fd:
+                    self.__metadata = metadata_loads(fd.read())
+            except json.JSONDecodeError:
+                if os.getenv("VERSUCHUNG_METADATA_EVAL"):
+                    with open(md_path, "r") as fd:
+                        self.__metadata = eval(fd.read())
+                else:
+                    raise RuntimeError("metadata is invalid JSON. Set VERSUCHUNG_METADATA_EVAL=1 to load metadata exported via pprint") from None
         return self.__metadata
 
     @property
@@ -498,11 +657,8 @@ class Experiment(Type, InputParameter):
 
         return metadata
 
-    def __getattribute__(self, name):
-         try:
-             return object.__getattribute__(self, name)
-         except AttributeError:
-             pass
+    def __getattr__(self, name):
+         # Only called if the normal attribute lookup fails
          inp = None
          outp = None
          try:
@@ -15,10 +15,7 @@
 
 from versuchung.types import InputParameter, OutputParameter, Type
 import versuchung.archives
-try:
-    from cStringIO import StringIO
-except ImportError:
-    from io import StringIO
+from io import StringIO
 import shutil
 import csv
 import os, stat
@@ -93,9 +90,19 @@ class File(FilesystemObject):
     disk before the experiment finishes.
     """
 
+    buffer_size = 1 << 17
+    """Size of the write buffer that is used when the content is
+    flushed to disk"""
+
     def __init__(self, default_filename="", binary=False):
         FilesystemObject.__init__(self, default_filename)
         self.__value = None
+        # Appended content, which was not yet merged into __value
+        self.__chunks = []
+        # Was __value changed since it was read or flushed?
+        self.__dirty = False
+        # Was __value assigned since the last flush?
+        self.__replaced = False
 
         self.__binary = binary
         if binary:
@@ -110,16 +117,56 @@ class File(FilesystemObject):
         content of the specified file"""
         if not self.__value:
             try:
-                with open(self.original_path, "r" + self.__binary_mode) as fd:
-                    self.__value = self.after_read(fd.read())
+                self.__value = self.after_read(self.__read())
             except IOError:
                 # File couldn't be read
                 self.__value = self.after_read("")
+        if self.__chunks:
+            self.__value += self.__chunks[0][:0].join(self.__chunks)
+            self.__chunks = []
+            self.__dirty = True
         return self.__value
 
     @value.setter
     def value(self, value):
         self.__value = value
+        self.__chunks = []
+        self.__dirty = True
+        self.__replaced = True
+
+    def __read(self):
+        # A plain open().read() issues several fstat/lseek/ioctl calls
+        # before reading; for regular files reading st_size bytes is
+        # sufficient.
+        fd = os.open(self.original_path, os.O_RDONLY)
+        try:
+            st = os.fstat(fd)
+            chunks = []
+            # A single read() returns at most ~2 GiB on Linux
+            remaining = st.st_size
+            while remaining > 0:
+                chunk = os.read(fd, remaining)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                remaining -= len(chunk)
+            if not stat.S_ISREG(st.st_mode) or not st.st_size:
+                # Pipes and pseudo files (/proc) report no useful size
+                while True:
+                    chunk = os.read(fd, self.buffer_size)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+            data = b"".join(chunks)
+        finally:
+            os.close(fd)
+        if self.__binary:
+            return data
+        data = data.decode()
+        if "\r" in data:
+            # Universal newlines, as in text mode of open()
+            data = data.replace("\r\n", "\n").replace("\r", "\n")
+        return data
 
     @property
     def original_path(self):
@@ -130,7 +177,7 @@ class File(FilesystemObject):
         `append` is `False`, then the property :attr:`value` is reset
         (i.e., overwritten), otherwise the content is appendend"""
         if append:
-            self.value += content
+            self.__chunks.append(content)
         else:
             self.value = content
 
@@ -142,13 +189,45 @@ class File(FilesystemObject):
 
     def flush(self):
         """Flush the cached content of the file to disk"""
-        if self.__value == None:
-            return
-        with open(self.original_path, "w" + self.__binary_mode + "+") as fd:
+        if not self.__chunks:
+            if self.__value is None:
+                return
+            # Content, that was only read, is already on disk. Mutable
+            # values (e.g., the rows of a CSV_File) can be changed in
+            # place and are always written.
+            if not self.__dirty and isinstance(self.__value, (str, bytes)):
+                return
+
+        cls = type(self)
+        if cls.before_write is File.before_write and cls.after_read is File.after_read:
+            # Without a filter, the content and the appended chunks are
+            # written one after another instead of joining them first.
+            if not self.__value and not self.__replaced:
+                # Nothing is cached (an empty value is read again from
+                # disk). Therefore, the chunks are appended to the
+                # file without loading it. An assigned empty value
+                # still truncates the file.
+                mode = "ab"
+                parts = self.__chunks
+            else:
+                mode = "wb"
+                parts = [self.__value] + self.__chunks
+                # The file content is read again on demand
+                self.__value = None
+            self.__chunks = []
+            with open(self.original_path, mode, buffering=self.buffer_size) as fd:
+                for part in parts:
+                    fd.write(part.encode() if isinstance(part, str) else part)
+        else:
             v = self.before_write(self.value)
             if v is None:
                 v = ""
-            fd.write(v)
+            if isinstance(v, str):
+                v = v.encode()
+            with open(self.original_path, "wb", buffering=self.buffer_size) as fd:
+                fd.write(v)
+        self.__dirty = False
+        self.__replaced = False
 
     def copy_contents(self, filename):
         """Read the given file and replace the current .value with the
@@ -249,7 +328,7 @@ class Directory(FilesystemObject, Directory_op_with):
 
        with directory as dir:
           # Do something with adjusted current working directory
-          print os.curdir
+          print(os.curdir)
 
     """
 
@@ -267,10 +346,10 @@ class Directory(FilesystemObject, Directory_op_with):
     @property
     def value(self):
         """:return: list -- directories and files in given directory"""
-        if not self.__value:
-            self.__value = os.listdir(self.path)
-            self.__value = [x for x in self.__value
-                            if fnmatch.fnmatch(x, self.filename_filter)]
+        if self.__value is None:
+            with os.scandir(self.path) as it:
+                self.__value = [e.name for e in it
+                                if fnmatch.fnmatch(e.name, self.filename_filter)]
         return self.__value
 
     def __iter__(self):
@@ -314,6 +393,7 @@ class Directory(FilesystemObject, Directory_op_with):
         f.set_path(self.path, name)
         f.value = ""
         self.subobjects[name] = f
+        self.__value = None
         return f
 
     def new_directory(self, name):
@@ -327,6 +407,7 @@ class Directory(FilesystemObject, Directory_op_with):
         f.set_path(self.path, name)
         os.mkdir(f.path)
         self.subobjects[name] = f
+        self.__value = None
         return f
 
 
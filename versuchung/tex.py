@@ -12,11 +12,12 @@
 # You should have received a copy of the GNU General Public License along with
 # versuchung.  If not, see <http://www.gnu.org/licenses/>.
 
-from __future__ import print_function
-
 from versuchung.files import File
+import copyreg
+import io
 import re
 import os
+from itertools import zip_longest
 
 class Macros(File):
     """Can be used as: **input parameter** and **output parameter**
@@ -34,9 +35,13 @@ class Macros(File):
     >>> from versuchung.tex import Macros
     >>> macro = Macros("/tmp/test.tex")
     >>> macro.macro("MyNewTexMacro", 23)
-    >>> print macro.value
+    >>> print(macro.value)
     \\newcommand{\MyNewTexMacro} {23}
 
+    The macros are collected in memory and are appended to the file
+    in one go, when the experiment finishes or :meth:`flush` is
+    called.
+
     """
     def __init__(self, filename = "data.tex"):
         """Define tex macros directly as output of a experiment.
@@ -55,8 +60,8 @@ class Macros(File):
 
     def comment(self, comment):
         """Add a comment in the macro file"""
-        for line in comment.split("\n"):
-            self.write("%% %s\n" % line.strip(), append = True)
+        text = "".join(["%% %s\n" % line.strip() for line in comment.split("\n")])
+        self.write(text, append = True)
 
     def newline(self):
         """Append an newline to the texfile"""
@@ -75,7 +80,7 @@ class PgfKeyDict(File, dict):
     >>> pgf = PgfKeyDict("/tmp/test.tex")
     >>> pgf["abcd"] = 23
     >>> pgf.flush()  # flush method of File
-    >>> print open("/tmp/test.tex").read()
+    >>> print(open("/tmp/test.tex").read())
     \\pgfkeyssetvalue{/versuchung/abcd}{23}
 
     In the TeX source you can do something like::
@@ -91,46 +96,189 @@ class PgfKeyDict(File, dict):
        It is better to use :class:`PgfKeyDict` instead of :class:`Macros`, because
        you can also use spaces and other weird characters in pgfkeys,
        which cannot be used in TeX macro names.
+
+    The keys of an existing file are read, when the dict or
+    :attr:`value` is accessed for the first time, and at the latest
+    on :meth:`flush`. With ``read_existing=True``, they are already
+    loaded in the constructor. In both cases, keys that are set in the
+    program take precedence over the keys in the file.
     """
 
-    def __init__(self, filename = "data.tex", pgfkey = "/versuchung", setmacro="pgfkeyssetvalue"):
+    def __init__(self, filename = "data.tex", pgfkey = "/versuchung", setmacro="pgfkeyssetvalue",
+                 read_existing = False):
         File.__init__(self, filename)
         dict.__init__(self)
+        # Sorted keys for before_write(), reset on every modification
+        self.__sorted_keys = None
 
         self.__pgfkey = pgfkey
         self.format_string = "\\" + setmacro + "{%s/%s}{%s}"
-
-        # Ensure the file is written
+        # Derived from format_string by __format_parts()
+        self.__parts = None
+
+        # Otherwise, an existing file is parsed on the first access.
+        # For output parameters, the path is only valid once the
+        # experiment runs.
+        self.__loaded = False
+        if read_existing:
+            self.__load()
+            self.value = self
+
+    def __load(self):
+        if self.__loaded:
+            return
+        self.__loaded = True
         if os.path.exists(self.path):
-            a = self.value
-
+            # Parse the file line by line, instead of reading it as a
+            # whole into the value first.
+            with open(self.path, "r", buffering=1 << 16) as fd:
+                self.__parse(fd)
+
+    def __reduce_ex__(self, protocol):
+        # Copying (e.g., the parameter templates of an experiment)
+        # must not load the file
+        return (copyreg.__newobj__, (type(self),), self.__dict__.copy(),
+                None, iter(dict.items(self)))
+
+    # Accessors, which load the file first
+
+    def __getitem__(self, key):
+        self.__load()
+        return dict.__getitem__(self, key)
+
+    def __contains__(self, key):
+        self.__load()
+        return dict.__contains__(self, key)
+
+    def __len__(self):
+        self.__load()
+        return dict.__len__(self)
+
+    def __iter__(self):
+        self.__load()
+        return dict.__iter__(self)
+
+    def get(self, *args):
+        self.__load()
+        return dict.get(self, *args)
+
+    def keys(self):
+        self.__load()
+        return dict.keys(self)
+
+    def values(self):
+        self.__load()
+        return dict.values(self)
+
+    def items(self):
+        self.__load()
+        return dict.items(self)
+
+    def copy(self):
+        self.__load()
+        return dict.copy(self)
+
+    # Modifications, which reset the sorted keys. Keys that are set
+    # before the file is loaded take precedence over the file.
+
+    def __setitem__(self, key, value):
+        self.__sorted_keys = None
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self.__load()
+        self.__sorted_keys = None
+        dict.__delitem__(self, key)
+
+    def __ior__(self, other):
+        self.__sorted_keys = None
+        return dict.__ior__(self, other)
+
+    def update(self, *args, **kwargs):
+        self.__sorted_keys = None
+        dict.update(self, *args, **kwargs)
+
+    def setdefault(self, key, default=None):
+        self.__load()
+        self.__sorted_keys = None
+        return dict.setdefault(self, key, default)
+
+    def pop(self, *args):
+        self.__load()
+        self.__sorted_keys = None
+        return dict.pop(self, *args)
+
+    def popitem(self):
+        self.__load()
+        self.__sorted_keys = None
+        return dict.popitem(self)
+
+    def clear(self):
+        # The keys of the file are discarded as well
+        self.__loaded = True
+        self.__sorted_keys = None
+        dict.clear(self)
+
+    def __format_parts(self):
+        """Return the literal parts of a formatted line around the key
+        and the value, and a regex that parses such a line. They are
+        derived again, if format_string was changed."""
+        if self.__parts is None or self.__parts[0] != self.format_string:
+            line = self.format_string % (self.__pgfkey, "\0", "\0")
+            key_open, mid, close = line.split("\0")
+            regex = re.compile(re.escape(key_open) + "([^{}]*)"
+                               + re.escape(mid) + "([^{}]*)"
+                               + re.escape(close))
+            self.__parts = (self.format_string, key_open, mid, close, regex)
+        return self.__parts[1:]
+
+    def __parse(self, lines):
+        # Each match yields a (key, value) pair
+        regex = self.__format_parts()[3]
+        pairs = (m.groups() for m in map(regex.search, lines) if m)
+        if dict.__len__(self):
+            # Keys that were set before the file is parsed lazily take
+            # precedence over the keys in the file
+            pairs = [(k, v) for (k, v) in pairs if not dict.__contains__(self, k)]
+        self.update(pairs)
 
     def after_read(self, value):
-        regex = self.format_string %(self.__pgfkey,"([^{}]*)", "([^{}]*)")
-        regex = regex.replace('\\', r'\\')
-        for line in value.split("\n"):
-            m = re.search(regex, line)
-            if m:
-                self[m.groups()[0]] = m.groups()[1]
+        self.__loaded = True
+        # Only newlines separate the lines, like when iterating the file
+        self.__parse(value.split("\n"))
         return self
 
     def before_write(self, value):
-        v = []
+        if isinstance(value, str):
+            # Already serialized by flush()
+            return value
+        buf = io.StringIO()
+        w = buf.write
         last_base_key = None
-        for key in sorted(self):
+        keys = self.__sorted_keys
+        if keys is None:
+            # list.sort() detects already sorted keys in linear time
+            keys = list(self)
+            keys.sort()
+            self.__sorted_keys = keys
+        key_open, mid, close = self.__format_parts()[:3]
+        close += "\n"
+        for key in keys:
             value = self[key]
-            if "/" in key:
-                base_key = key[:key.rindex("/")]
-            else:
+            base_key, sep, _ = key.rpartition("/")
+            if not sep:
                 base_key = None
             if last_base_key and last_base_key != base_key:
-                v.append("")
+                w("\n")
             last_base_key = base_key
-            v.append(self.format_string % (self.__pgfkey, key, value))
+            w(key_open + key + mid + str(value) + close)
 
-        return "\n".join(v) + "\n"
+        # An empty dict results in a single newline
+        return buf.getvalue() or "\n"
 
     def flush(self):
+        # The serialized keys are staged as value, so File.flush()
+        # writes them without calling before_write() on the dict again
         self.value = self.before_write(self)
         File.flush(self)
 
@@ -175,8 +323,9 @@ class PgfKeyDict(File, dict):
            th=4/load => 4.0
 
         With the ``names`` parameter, you can control whether a level
-        should be prefixed with the index name. In the above example,
-        ``th=`` is the result of the names parameter. A useful pattern
+        should be prefixed with the index name. It is either a list of
+        level names or ``True`` for all named levels. In the above
+        example, ``th=`` is the result of the names parameter. A useful pattern
         is to ``describe()`` a column:
 
           >>> pgf.pandas(df.speedup.describe(), prefix="speedup", verbose=True)
@@ -189,7 +338,13 @@ class PgfKeyDict(File, dict):
           speedup/75 percent => 1.375
           speedup/max => 1.5
         """
-        import pandas as pd
+        # Imported here, as importing pandas takes longer than all
+        # other uses of this module. Since the rows are no longer
+        # traversed recursively, this runs once per call.
+        try:
+            import pandas as pd
+        except ImportError:
+            raise RuntimeError("Please install pandas to use PgfKeyDict.pandas()")
 
         if prefix: prefix += "/"
         else:      prefix = ""
@@ -199,43 +354,70 @@ class PgfKeyDict(File, dict):
                 return seq
             return [seq]
 
-        def zip_extend(a, b):
-            a_len, b_len = len(a), len(b)
-            ret_len = max(a_len, b_len)
-            return zip(list(a) + [None] * (ret_len - a_len), list(b) + [None] * (ret_len - b_len))
+        # Constant for all fmt() calls
+        all_names = names is True
+        if isinstance(names, str):
+            name_set = frozenset([names])
+        elif hasattr(names, "__iter__"):
+            name_set = frozenset(names)
+        else:
+            name_set = frozenset()
 
         def fmt(name, key):
             ret = []
-            for k, v in zip_extend(wrap_list(name), wrap_list(key)):
-                # print(names, k, hasattr(names, "__contains__") and k in names)
-                if k is not None and names == True or (hasattr(names, "__contains__") and k in names):
+            for k, v in zip_longest(wrap_list(name), wrap_list(key)):
+                if k is not None and (all_names or k in name_set):
                     ret.append(f"{k}={v}")
                 else:
                     ret.append(str(v))
             return "/".join(ret)
 
         if isinstance(df, pd.DataFrame):
-            for index, row in df.iterrows():
-                pp = fmt(df.index.name or df.index.names, index)
-                self.pandas(row, prefix=prefix+pp, names=names, verbose=verbose)
+            # Iterate over the rows of the underlying array (the same
+            # values, with the same upcasting, as df.iterrows()), but
+            # without materializing a Series for every row. The column
+            # part of the keys is formatted only once. As the percent
+            # replacement is applied to the parts, each key is a single
+            # concatenation.
+            index_names = df.index.name or df.index.names
+            column_names = df.columns.name or df.columns.names
+            columns = [fmt(column_names, column).replace("%", " percent")
+                       for column in df.columns]
+            prefix = prefix.replace("%", " percent")
+            row_prefixes = [prefix + fmt(index_names, index).replace("%", " percent") + "/"
+                            for index in df.index]
+            values = df.values
+            if values.dtype.kind in "mM":
+                # Box datetime64/timedelta64 into Timestamp/Timedelta,
+                # like the row Series of iterrows() did
+                values = df.astype(object).values
+            pairs = [(row_prefix + column, value)
+                     for row_prefix, row in zip(row_prefixes, values)
+                     for column, value in zip(columns, row)]
         elif isinstance(df, pd.Series):
-            for key in df.index:
-                pp = fmt(df.index.name or df.index.names, key)
-                dref_key = (prefix + pp).replace("%", " percent")
-                if verbose: print(f"{dref_key} => {df.loc[key]}")
-                self[dref_key] = df.loc[key]
+            # df.array yields the same scalars as df.loc[key], without
+            # a label lookup for every key
+            index_names = df.index.name or df.index.names
+            prefix = prefix.replace("%", " percent")
+            pairs = [(prefix + fmt(index_names, key).replace("%", " percent"), value)
+                     for key, value in zip(df.index, df.array)]
         else:
             raise ValueError("Please supply a pandas.DataFrame or pandas.Series")
 
+        if verbose:
+            for dref_key, value in pairs:
+                print(f"{dref_key} => {value}")
+        self.update(pairs)
+
 
 class DatarefDict(PgfKeyDict):
     """Can be used as: **input parameter** and **output parameter**
 
     DatarefDict is like :class:`~versuchung.tex.PgfKeyDict`, but generates keys for dataref."""
 
-    def __init__(self, filename = "data.tex", key = ""):
-        PgfKeyDict.__init__(self, filename, key, "drefset")
+    def __init__(self, filename = "data.tex", key = "", read_existing = False):
+        PgfKeyDict.__init__(self, filename, key, "drefset", read_existing)
 
 if __name__ == '__main__':
     import sys
-    print(PgfKeyDict(sys.argv[1]))
+    print(PgfKeyDict(sys.argv[1], read_existing=True))
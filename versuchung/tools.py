@@ -31,6 +31,72 @@ class JavascriptStyleDictAccess(dict):
             return self[name]
         raise AttributeError
 
+class LazyJavascriptStyleDictAccess(JavascriptStyleDictAccess):
+    """A JavascriptStyleDictAccess that calls resolve() once, before
+    the first value of the dictionary is accessed. The keys must not
+    be changed by resolve(). If resolve() fails, it is called again on
+    the next access."""
+    def __init__(self, d, resolve):
+        JavascriptStyleDictAccess.__init__(self, d)
+        self.__resolve = resolve
+
+    def _resolve(self):
+        resolve = self.__resolve
+        if resolve is not None:
+            # resolve() may access the dictionary itself
+            self.__resolve = None
+            try:
+                resolve()
+            except:
+                self.__resolve = resolve
+                raise
+
+    def __getitem__(self, key):
+        self._resolve()
+        return dict.__getitem__(self, key)
+
+    def __iter__(self):
+        # Overriding __iter__ also makes dict(d) and {**d} use keys()
+        # and __getitem__ instead of copying the values directly
+        self._resolve()
+        return dict.__iter__(self)
+
+    def __repr__(self):
+        self._resolve()
+        return dict.__repr__(self)
+
+    def get(self, *args):
+        self._resolve()
+        return dict.get(self, *args)
+
+    def keys(self):
+        self._resolve()
+        return dict.keys(self)
+
+    def values(self):
+        self._resolve()
+        return dict.values(self)
+
+    def items(self):
+        self._resolve()
+        return dict.items(self)
+
+    def pop(self, *args):
+        self._resolve()
+        return dict.pop(self, *args)
+
+    def popitem(self):
+        self._resolve()
+        return dict.popitem(self)
+
+    def setdefault(self, *args):
+        self._resolve()
+        return dict.setdefault(self, *args)
+
+    def copy(self):
+        self._resolve()
+        return dict.copy(self)
+
 
 
 def setup_logging(log_level):
@@ -12,14 +12,8 @@
 # You should have received a copy of the GNU General Public License along with
 # versuchung.  If not, see <http://www.gnu.org/licenses/>.
 
-from __future__ import print_function
-
 import os
 import csv
-try:
-    from cStringIO import StringIO
-except ImportError:
-    from io import StringIO
 from optparse import OptionParser
 import copy
 import glob